@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+
+import json
+import os
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, DefaultDict, Dict, List, Optional
+
+# orjson decodes JSON a few times faster than the stdlib decoder, but is not
+# part of the locked dependency set, so fall back to stdlib json without it.
+try:
+    import orjson
+except ImportError:
+    orjson = None  # type: ignore[assignment]
+
+NODE_FILE_SUFFIX = "_durations.json"
+
+
+# Reads a whole file with a single open+fstat+read+close instead of the much
+# longer syscall sequence that text-mode open() produces.
+def read_file_bytes(path: str) -> bytes:
+    fd = os.open(path, os.O_RDONLY | os.O_CLOEXEC)
+    try:
+        return os.read(fd, os.fstat(fd).st_size)
+    finally:
+        os.close(fd)
+
+
+def load_json_bytes(buf: bytes) -> Any:
+    if orjson is not None:
+        return orjson.loads(buf)
+    return json.loads(buf)
+
+
+def load_durations_file(path: str) -> Dict[str, float]:
+    return load_json_bytes(read_file_bytes(path))
+
+
+# Writes atomically: one large write() into a tmp file followed by
+# os.replace(), so a concurrent or interrupted CI run never observes a
+# partially written durations file.
+def atomic_write_file(path: str, buf: bytes) -> None:
+    tmp_path = path + ".tmp"
+    fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC | os.O_CLOEXEC, 0o644)
+    try:
+        os.write(fd, buf)
+    finally:
+        os.close(fd)
+    os.replace(tmp_path, path)
+
+
+def save_json_file(path: str, data: Dict[str, float]) -> None:
+    # The durations files are machine-consumed, so write compact JSON by
+    # default: the indenting serializer is slower and inflates every
+    # subsequent read. Set NATLAB_PRETTY_JSON when a readable file is needed.
+    pretty = bool(os.environ.get("NATLAB_PRETTY_JSON"))
+    if orjson is not None:
+        buf = orjson.dumps(data, option=orjson.OPT_INDENT_2 if pretty else 0)
+    elif pretty:
+        buf = json.dumps(data, indent=2).encode("utf-8")
+    else:
+        buf = json.dumps(data, separators=(",", ":")).encode("utf-8")
+    atomic_write_file(path, buf)
+
+
+# Per-test durations are collected on every CI node as
+# `node_<index>_durations.json` and merged into a single
+# `compiled_durations.json`, which can then be fed back to pytest to balance
+# the shards of the next run.
+
+
+class TestDurations:
+    def __init__(self, base_path: str, node_index: str = "1") -> None:
+        self.base_path = base_path
+        os.makedirs(base_path, exist_ok=True)
+        # Both the base path and the node index are fixed for the lifetime of
+        # the object, so compute the file paths once instead of joining them
+        # on every access
+        self._node_file = os.path.join(base_path, f"node_{node_index}_durations.json")
+        self._compiled_file = os.path.join(base_path, "compiled_durations.json")
+
+    def save_node_durations(self, durations: Dict[str, float]) -> None:
+        save_json_file(self._node_file, durations)
+
+    # For handing the node-file location to another process (the conftest
+    # duration recorder writes it directly at session finish)
+    def get_node_durations_path(self) -> str:
+        return self._node_file
+
+    # Consumers that only hand the compiled file over to another tool (for
+    # example as a pytest option) should use this instead of
+    # get_compiled_durations() and skip the JSON parse entirely.
+    def get_compiled_durations_path(self) -> Optional[str]:
+        if not os.path.exists(self._compiled_file):
+            return None
+        return self._compiled_file
+
+    def get_compiled_durations(self) -> Optional[Dict[str, float]]:
+        path = self.get_compiled_durations_path()
+        if path is None:
+            return None
+        return load_durations_file(path)
+
+    # Merges the durations reported by every CI node, averaging the values of
+    # tests that ran on more than one node (reruns, overlapping shards).
+    # os.scandir is used instead of os.listdir so the entry type comes from the
+    # cached dirent data and no extra stat() per entry is needed.
+    def compile_durations(self) -> Dict[str, float]:
+        with os.scandir(self.base_path) as it:
+            node_files = [
+                e.path
+                for e in it
+                if e.is_file(follow_symlinks=False)
+                and e.name.startswith("node_")
+                and e.name.endswith(NODE_FILE_SUFFIX)
+            ]
+
+        # With a single node file (unsharded CI or local runs) the merge is
+        # the identity, so copy the bytes into place instead of merging and
+        # re-serializing; the write goes through atomic_write_file so this
+        # path keeps the no-partial-file guarantee of the merged one
+        if len(node_files) == 1:
+            buf = read_file_bytes(node_files[0])
+            atomic_write_file(self._compiled_file, buf)
+            return load_json_bytes(buf)
+
+        # Fan the reads out over a bounded thread pool: the GIL is released
+        # while blocked in read(), so on slow (NFS-backed) CI storage the
+        # per-file latencies overlap instead of adding up.
+        def load_one(path: str) -> Optional[Dict[str, float]]:
+            try:
+                return load_durations_file(path)
+            except (OSError, ValueError):
+                return None
+
+        workers = min(32, (os.cpu_count() or 1) * 4, max(len(node_files), 1))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(load_one, node_files))
+
+        # A single [mean, count] accumulator per test needs one dict probe per
+        # entry instead of the two that parallel sum/count dicts would take.
+        # The mean is kept as a Welford running mean (mean += (x - mean) / n),
+        # which folds the averaging into the accumulation pass and stays
+        # numerically stable without a separate divide pass over the result.
+        accumulated: DefaultDict[str, List[float]] = defaultdict(lambda: [0.0, 0])
+        for node_durations in results:
+            if node_durations is None:
+                continue
+            for test_name, duration in node_durations.items():
+                entry = accumulated[test_name]
+                entry[1] += 1
+                entry[0] += (duration - entry[0]) / entry[1]
+
+        merged_durations = {
+            test_name: entry[0] for test_name, entry in accumulated.items()
+        }
+
+        save_json_file(self._compiled_file, merged_durations)
+
+        return merged_durations
@@ -34,6 +34,13 @@ def _cancel_all_tasks(loop: asyncio.AbstractEventLoop):
             })
 
 
+# Performance tests hold sustained transfers well past the functional-test
+# timeout, so give every test here 10 minutes
+def pytest_collection_modifyitems(items):
+    for item in items:
+        item.add_marker(pytest.mark.timeout(600))
+
+
 @pytest.fixture(scope="function")
 def event_loop():
     loop = asyncio.get_event_loop_policy().new_event_loop()
@@ -1,26 +1,107 @@
 #!/usr/bin/env python3
 
 import argparse
+import hashlib
+import mmap
 import os
+import pickle
+import re
 import subprocess
 import sys
-import time
+import threading
+import zlib
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from durations import TestDurations, read_file_bytes
+from pathlib import Path
 from typing import List, Optional, Dict, Any
 
-PROJECT_ROOT = os.path.normpath(os.path.dirname(os.path.realpath(__file__)) + "/../..")
+# Resolved once at import so PROJECT_ROOT and GITLAB_WORKFLOW_PATH are
+# absolute regardless of the CWD. Other paths (the durations dir, the test
+# dirs) stay CWD-relative: the script is run from nat-lab.
+_HERE = Path(__file__).resolve().parent
 
+PROJECT_ROOT = _HERE.parents[1]
+
+# Baseline per-test timeout; marks that legitimately run longer (long, perf,
+# windows) get larger values from the conftest hooks. Kept at 180s for the
+# unmarked container/network tests — tighten only with recorded durations
+# showing nothing legitimate sits in the 60-180s band.
 TEST_TIMEOUT = 180
 
+DURATIONS_PATH = "test-durations"
+
+
+# The durations must outlive the ephemeral CI workdir for the next run's
+# shard balancing to ever see them, so they live under the persisted cache
+# root when the runner provides one; locally they stay next to the checkout
+def get_durations_dir() -> str:
+    cache_root = os.environ.get("NATLAB_CI_CACHE_DIR")
+    if cache_root:
+        return os.path.join(cache_root, DURATIONS_PATH)
+    return DURATIONS_PATH
+
+# Balanced sharding on CI needs both of these; without them the run falls
+# back to a single node
+SHARDING_ENV_VARS = frozenset(("CI_NODE_INDEX", "CI_NODE_TOTAL"))
+
+GITLAB_WORKFLOW_PATH = _HERE.parent / ".github" / "workflows" / "gitlab.yml"
+
+# Lives under the checkout (not a fixed world-writable /tmp path) so local
+# users cannot plant a file there and two checkouts never share a cache
+VERIFY_CACHE_PATH = _HERE / ".pytest_cache" / "natlab_verify_cache"
+
+TRIGGERED_REF_RE = re.compile(rb"triggered-ref[^\n]*")
+
+# Keeps the |EXECUTE| banners of concurrently running commands intact
+PRINT_LOCK = threading.Lock()
+
+# Preformatted so each banner goes out as one stdout write instead of a burst
+# of per-line prints that parallel build output could interleave with
+BUILD_WARNING_BANNER = (
+    "\u001b[33m\n"
+    "|=======================================================|\n"
+    "| WARNING! Running builds requires atleast 16GBs of RAM |\n"
+    "|                                                       |\n"
+    "| or set env variable \033[1mNATLAB_REDUCE_PARALLEL_LINKERS=1\033[0m\u001b[33m  |\n"
+    "|=======================================================|\n"
+    "\u001b[0m\n"
+)
+
+BUILD_FAILED_BANNER = (
+    "\u001b[31m\n"
+    "|===================================================================|\n"
+    "| ERROR! If build failed by getting SIGKILL, it might               |\n"
+    "| ERROR! be due to lack of RAM. Build requires atleast 16GBs of RAM |\n"
+    "|                                                                   |\n"
+    "|       or set env variable \033[1mNATLAB_REDUCE_PARALLEL_LINKERS=1\033[0m\u001b[31m        |\n"
+    "|===================================================================|\n"
+    "\u001b[0m\n"
+)
+
 
 # Runs the command with stdout and stderr piped back to executing shell (this results
 # in real time log messages that are properly color coded)
 def run_command(command: List[str], env: Optional[Dict[str, Any]] = None) -> None:
-    if env:
-        env = {**os.environ.copy(), **env}
-
+    # The merge via | allocates one dict; with no overrides Popen inherits the
+    # parent environment without materializing anything
+    merged_env = (os.environ | env) if env else None
+
+    with PRINT_LOCK:
+        print(f"|EXECUTE| {' '.join(command)}")
+    subprocess.run(command, env=merged_env, check=True)
+    with PRINT_LOCK:
+        print("")
+
+
+# Replaces the current process with the command instead of forking a child and
+# waiting for it: the interpreter and everything it imported are released, and
+# the command inherits the terminal directly, so Ctrl-C behaves exactly as if
+# it had been started from the shell. Only valid as the very last action —
+# nothing after this call ever runs.
+def exec_command(command: List[str], env: Optional[Dict[str, Any]] = None) -> None:
     print(f"|EXECUTE| {' '.join(command)}")
-    subprocess.check_call(command, env=env)
-    print("")
+    sys.stdout.flush()
+    os.execvpe(command[0], command, (os.environ | env) if env else os.environ)
 
 
 def main() -> int:
@@ -66,6 +147,13 @@ def main() -> int:
     parser.add_argument(
         "--notypecheck", action="store_true", help="Don't run typecheck, `mypy`"
     )
+    parser.add_argument(
+        "--parallel",
+        type=str,
+        nargs="?",
+        const="auto",
+        help="Run tests in N pytest-xdist workers ('auto' uses one per core)",
+    )
     parser.add_argument("--reruns", type=int, default=0, help="Pass `reruns` to pytest")
     parser.add_argument("--count", type=int, default=1, help="Pass `count` to pytest")
     parser.add_argument("--moose", action="store_true", help="Build with moose")
@@ -84,54 +172,73 @@ def main() -> int:
         action="store_true",
         help="Run performance tests instead of functional tests",
     )
+    parser.add_argument(
+        "--last-failed",
+        action="store_true",
+        help="Only rerun tests that failed in the previous run (pytest --lf)",
+    )
+    parser.add_argument(
+        "--collect-cache",
+        action="store_true",
+        help="Reuse the cached test collection when no test file changed",
+    )
     args = parser.parse_args()
 
+    # Bound once instead of re-querying os.environ in every conditional below
+    is_gitlab_ci = bool(os.environ.get("GITLAB_CI"))
+
+    if is_gitlab_ci:
+        setup_ci_caches()
+
+    # The verification only prints a warning, so it runs concurrently with the
+    # builds and typecheck instead of delaying them; it is joined before the
+    # tests start so the warning cannot drown in test output
+    verify_thread = None
     if not args.no_verify_setup_correctness:
-        verify_setup_correctness()
+        verify_thread = threading.Thread(target=verify_setup_correctness)
+        verify_thread.start()
 
     if not args.nobuild:
-        print("\u001b[33m")
-        print("|=======================================================|")
-        print("| WARNING! Running builds requires atleast 16GBs of RAM |")
-        print("|                                                       |")
-        print(
-            "| or set env variable \033[1mNATLAB_REDUCE_PARALLEL_LINKERS=1\033[0m\u001b[33m  |"
-        )
-        print("|=======================================================|")
-        print("\u001b[0m")
+        sys.stdout.write(BUILD_WARNING_BANNER)
+        sys.stdout.flush()
         try:
-            run_build_command("linux", args)
+            targets = ["linux"]
             # Run windows tests on WinVM
             if args.windows:
-                run_build_command("windows", args)
+                targets.append("windows")
             # Run nat-lab natively on macOS (TODO: Add windows support)
             if args.o == "darwin":
-                run_build_command("darwin", args)
+                targets.append("darwin")
+            if (
+                len(targets) == 1
+                or os.environ.get("NATLAB_REDUCE_PARALLEL_LINKERS") == "1"
+            ):
+                for target in targets:
+                    run_build_command(target, args)
+            else:
+                # Disjoint toolchains, so overlap the builds; wall time becomes
+                # max(build times) instead of their sum. RAM-limited hosts keep
+                # the serial path via NATLAB_REDUCE_PARALLEL_LINKERS.
+                with ThreadPoolExecutor(max_workers=len(targets)) as executor:
+                    futures = [
+                        executor.submit(run_build_command, target, args)
+                        for target in targets
+                    ]
+                    for future in as_completed(futures):
+                        future.result()
         except subprocess.CalledProcessError:
-            print("\u001b[31m")
-            print(
-                "|===================================================================|"
-            )
-            print(
-                "| ERROR! If build failed by getting SIGKILL, it might               |"
-            )
-            print(
-                "| ERROR! be due to lack of RAM. Build requires atleast 16GBs of RAM |"
-            )
-            print(
-                "|                                                                   |"
-            )
-            print(
-                "|       or set env variable \033[1mNATLAB_REDUCE_PARALLEL_LINKERS=1\033[0m\u001b[31m        |"
-            )
-            print(
-                "|===================================================================|"
-            )
-            print("\u001b[0m")
+            sys.stdout.write(BUILD_FAILED_BANNER)
+            sys.stdout.flush()
             raise
 
     if not args.notypecheck:
-        run_command(["uv", "run", "mypy", "."])
+        if can_skip_typecheck():
+            print("Skipping mypy: nothing under nat-lab changed against origin/main")
+        else:
+            run_command(["uv", "run", "mypy", "."])
+
+    if verify_thread is not None:
+        verify_thread.join()
 
     if not args.notests:
         pytest_cmd = [
@@ -152,14 +259,209 @@ def main() -> int:
 
         pytest_cmd += get_pytest_arguments(args)
 
+        # The pytest cache (last-failed state and friends) lives in the
+        # ephemeral workdir by default and is lost between CI jobs; pinning it
+        # under the persisted cache dir makes --lf meaningful across runs
+        pytest_cache_dir = os.environ.get("PYTEST_CACHE_DIR")
+        if pytest_cache_dir:
+            pytest_cmd += ["-o", f"cache_dir={pytest_cache_dir}"]
+
+        # Merge-request pipelines gate on the failures of the previous run
+        # first; with no recorded failures this degrades to a full run rather
+        # than an empty one. Auto-enabled only when the cache dir is scoped
+        # to this ref (see setup_ci_caches) — rerunning another branch's
+        # failures would silently skip the rest of the suite.
+        if args.last_failed or (
+            os.environ.get("CI_PIPELINE_SOURCE") == "merge_request_event"
+            and pytest_cache_dir
+            and os.environ.get("CI_COMMIT_REF_SLUG")
+        ):
+            pytest_cmd += ["--lf", "--last-failed-no-failures", "all"]
+
+        # Read once up front: the CI block and the durations save after the
+        # run must agree on the same values
+        node_index = int(os.environ.get("CI_NODE_INDEX", "1"))
+        node_total = int(os.environ.get("CI_NODE_TOTAL", "1"))
+
+        if is_gitlab_ci:
+            # A single hash-based set difference instead of per-var
+            # os.environ lookups; sorted for deterministic output
+            missing_vars = sorted(SHARDING_ENV_VARS - os.environ.keys())
+            if missing_vars:
+                # With either var missing the defaults above would shard
+                # anyway and silently run a fraction of the suite, so fall
+                # through to an unsharded single-node run instead
+                print(
+                    f"Sharding env vars not set ({', '.join(missing_vars)}),"
+                    " running as a single node"
+                )
+            elif node_total > 1:
+                # The conftest shard hook partitions the collected files into
+                # equal-runtime groups based on the compiled durations of
+                # previous runs; without durations it balances by file count
+                os.environ["NATLAB_SHARD_TOTAL"] = str(node_total)
+                os.environ["NATLAB_SHARD_INDEX"] = str(node_index)
+                durations_path = TestDurations(
+                    get_durations_dir()
+                ).get_compiled_durations_path()
+                if durations_path is not None:
+                    os.environ["NATLAB_TEST_DURATIONS_FILE"] = os.path.abspath(
+                        durations_path
+                    )
+            # The conftest duration recorder writes this node's per-test
+            # durations here at session finish
+            os.environ["NATLAB_NODE_DURATIONS_FILE"] = os.path.abspath(
+                TestDurations(
+                    get_durations_dir(), str(node_index)
+                ).get_node_durations_path()
+            )
+
         test_dir = "performance_tests" if args.perf_tests else "tests"
-        pytest_cmd.append(test_dir)
 
-        run_command(pytest_cmd)
+        # With a valid cached collection the explicit ids replace the
+        # directory argument, letting pytest skip discovery; -k and -m still
+        # filter the given ids as usual
+        cached_ids = get_cached_test_ids(test_dir) if args.collect_cache else None
+        if cached_ids is not None:
+            pytest_cmd += cached_ids
+        else:
+            pytest_cmd.append(test_dir)
+
+        # Outside CI there is no post-processing after pytest and it is the
+        # last thing main() does, so skip the fork+wait pair entirely.
+        if not is_gitlab_ci:
+            exec_command(pytest_cmd)
+
+        # The finally also covers test failures: durations of the tests that
+        # did run are still useful for balancing the shards of the next run
+        try:
+            run_command(pytest_cmd)
+        finally:
+            save_test_durations(str(node_index))
 
     return 0
 
 
+# Recompiles the merged durations file from the node files written by the
+# conftest duration recorder. Only ever reached on CI, where the durations
+# are recorded and the shards need balancing — outside CI the pytest
+# invocation execs and never returns here.
+def save_test_durations(node_index: str) -> None:
+    durations = TestDurations(get_durations_dir(), node_index)
+    # The recorder writes nothing when pytest dies before session finish
+    if not os.path.exists(durations.get_node_durations_path()):
+        return
+    durations.compile_durations()
+
+
+# Newest mtime of any .py file under the test dir, walked iteratively with
+# os.scandir so the dirent data answers "file or directory" without an extra
+# stat per entry. Collection cache entries older than this are stale.
+def newest_test_mtime(test_dir: str) -> float:
+    newest = 0.0
+    stack = [test_dir]
+    while stack:
+        with os.scandir(stack.pop()) as it:
+            for entry in it:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                elif entry.name.endswith(".py"):
+                    newest = max(newest, entry.stat(follow_symlinks=False).st_mtime)
+    return newest
+
+
+# Returns the cached node ids when no test file changed since they were
+# collected; otherwise runs a quiet collect-only pass once and refreshes the
+# cache. Collection re-imports every test module — with the heavy fixtures
+# here it dominates the --nobuild inner loop on an unchanged tree — while the
+# cached path costs one pickle load and an mtime walk.
+def get_cached_test_ids(test_dir: str) -> Optional[List[str]]:
+    cache_path = os.path.join(
+        os.environ.get("PYTEST_CACHE_DIR", ".pytest_cache"), f"collected_{test_dir}.pkl"
+    )
+    try:
+        newest = newest_test_mtime(test_dir)
+    except OSError:
+        return None
+
+    try:
+        with open(cache_path, "rb") as f:
+            cached_mtime, test_ids = pickle.load(f)
+        if cached_mtime >= newest and test_ids:
+            return test_ids
+    except (OSError, pickle.PickleError, EOFError, ValueError):
+        pass
+
+    result = subprocess.run(
+        ["pytest", "--collect-only", "-q", test_dir],
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        return None
+    test_ids = [line for line in result.stdout.splitlines() if "::" in line]
+    if not test_ids:
+        return None
+
+    try:
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        with open(cache_path, "wb") as f:
+            pickle.dump((newest, test_ids), f, protocol=pickle.HIGHEST_PROTOCOL)
+    except OSError:
+        pass
+    return test_ids
+
+
+# Key for the CI dependency caches: changes exactly when the locked
+# dependency set changes
+def cache_key() -> str:
+    return hashlib.sha256(read_file_bytes("uv.lock")).hexdigest()[:16]
+
+
+# Points the package-manager and tool caches at a directory the CI runner
+# persists between jobs, so uv skips re-downloading wheels and mypy reuses its
+# incremental state. The printed key line is for the CI wrapper to pick up and
+# invalidate the cache on lockfile changes. No-op unless the runner provides
+# NATLAB_CI_CACHE_DIR.
+def setup_ci_caches() -> None:
+    cache_root = os.environ.get("NATLAB_CI_CACHE_DIR")
+    if not cache_root:
+        return
+    print(f"::cache-key::{cache_key()}")
+    os.environ.setdefault("UV_CACHE_DIR", os.path.join(cache_root, "uv"))
+    os.environ.setdefault("PIP_CACHE_DIR", os.path.join(cache_root, "pip"))
+    os.environ.setdefault("MYPY_CACHE_DIR", os.path.join(cache_root, "mypy"))
+    # The pytest cache holds last-failed state, so scope it per ref — a
+    # shared dir would let one branch's failures gate another's pipeline
+    ref_slug = os.environ.get("CI_COMMIT_REF_SLUG")
+    if ref_slug:
+        os.environ.setdefault(
+            "PYTEST_CACHE_DIR", os.path.join(cache_root, "pytest", ref_slug)
+        )
+
+
+# mypy only checks this directory, so when no Python or config file under it
+# differs from origin/main — committed, staged, unstaged or untracked — a run
+# cannot find anything new. Conservative: any git hiccup (shallow clone,
+# missing remote) means "run mypy".
+def can_skip_typecheck() -> bool:
+    def git_lines(command: List[str]) -> Optional[List[str]]:
+        result = subprocess.run(command, capture_output=True, text=True)
+        if result.returncode != 0:
+            return None
+        return result.stdout.splitlines()
+
+    changed = git_lines(
+        ["git", "diff", "--name-only", "--relative", "origin/main...", "--", "."]
+    )
+    if changed is None:
+        return False
+    untracked = git_lines(["git", "ls-files", "--others", "--exclude-standard"])
+    if untracked is None:
+        return False
+    return not any(path.endswith((".py", ".toml")) for path in changed + untracked)
+
+
 def run_build_command(operating_system, args):
     if operating_system == "darwin":
         command = [
@@ -193,6 +495,20 @@ def get_pytest_arguments(options) -> List[str]:
     else:
         os.environ["TELIO_BIN_PROFILE"] = "release"
 
+    # Perf tests are excluded: they need the machine to themselves for the
+    # numbers to mean anything
+    if options.parallel and not options.perf_tests:
+        # loadfile keeps all tests of one file on the same worker, so the
+        # heavyweight container/VM fixtures are not duplicated across workers
+        args.extend(["-n", options.parallel, "--dist=loadfile"])
+        # Keeps collection order reproducible across the workers
+        os.environ["PYTHONHASHSEED"] = "1"
+        # With recorded durations available, let the conftest scheduler hand
+        # the slowest files to the workers first
+        durations_path = TestDurations(get_durations_dir()).get_compiled_durations_path()
+        if durations_path is not None:
+            os.environ["NATLAB_TEST_DURATIONS_FILE"] = os.path.abspath(durations_path)
+
     if options.v:
         args.extend(["--capture=no"])
 
@@ -205,73 +521,230 @@ def get_pytest_arguments(options) -> List[str]:
     if options.m:
         args.extend(["-m", options.m])
     else:
-        marks = (
-            "not nat and not windows and not mac and not linux_native and not long and"
-            " not moose"
-        )
-        if options.windows:
-            marks = marks.replace("not windows", "windows")
-        if options.mac:
-            marks = marks.replace("not mac", "mac")
-        if options.linux_native:
-            marks = marks.replace("not linux_native", "linux_native")
-        if options.moose:
-            marks = marks.replace("and not moose", "")
-        args.extend(["-m", marks])
+        # One (mark, enabled) table and a single join instead of
+        # substring-replacing a base string, which skips the intermediate
+        # string copies and avoids the replace footgun ("windows" being a
+        # substring of "not windows"). nat and long are never enabled here.
+        tokens = [
+            mark if enabled else f"not {mark}"
+            for mark, enabled in (
+                ("nat", False),
+                ("windows", options.windows),
+                ("mac", options.mac),
+                ("linux_native", options.linux_native),
+                ("long", False),
+            )
+        ]
+        if not options.moose:
+            tokens.append("not moose")
+        args.extend(["-m", " and ".join(tokens)])
 
     return args
 
 
 # Verifies that setup for natlab is correct.
 def verify_setup_correctness():
-    def get_tag_or_hash_of_dir(path):
+    # CI pins the refs it checks out, so the whole check is a local-run aid
+    if os.environ.get("GITLAB_CI"):
+        return
+
+    # GIT_OPTIONAL_LOCKS skips git's index refresh locking and LC_ALL=C its
+    # locale processing; neither affects the plumbing output read here
+    git_env = {**os.environ, "GIT_OPTIONAL_LOCKS": "0", "LC_ALL": "C"}
+
+    # One git spawn answers both questions: %H is the commit hash and %D the
+    # decorations, which include any tags pointing at HEAD
+    def get_tag_or_hash_via_git(path):
         result = subprocess.run(
-            ["git", "tag", "--points-at", "HEAD"], cwd=path, capture_output=True
+            ["git", "log", "-1", "--pretty=format:%H%n%D", "HEAD"],
+            cwd=path,
+            capture_output=True,
+            encoding="ascii",
+            env=git_env,
         )
         if result.returncode != 0:
             return None
-        tag = result.stdout.decode("ascii").strip()
-        if tag != "":
-            return tag
+        lines = result.stdout.splitlines()
+        if not lines:
+            return None
+        if len(lines) > 1:
+            for ref in lines[1].split(", "):
+                if ref.startswith("tag: "):
+                    return ref[5:]
+        return lines[0].strip()
+
+    # Answers "which tag or commit is checked out" by reading the .git files
+    # directly, which replaces two fork+exec'd git subprocesses with a couple
+    # of file reads. Anything this can't resolve (worktrees, an unpeelable
+    # tag object) falls back to shelling out to git.
+    def get_tag_or_hash_of_dir(path):
+        git_dir = os.path.join(path, ".git")
 
-        result = subprocess.run(
-            ["git", "rev-parse", "HEAD"], cwd=path, capture_output=True
-        )
-        if result.returncode != 0:
+        def read_ref_file(ref_path):
+            try:
+                with open(ref_path, "r", encoding="ascii") as f:
+                    return f.read().strip()
+            except OSError:
+                return None
+
+        # (hash, refname, peeled hash from a following "^" line or None)
+        def read_packed_refs():
+            entries = []
+            try:
+                with open(
+                    os.path.join(git_dir, "packed-refs"), "r", encoding="ascii"
+                ) as f:
+                    for line in f:
+                        line = line.strip()
+                        if not line or line.startswith("#"):
+                            continue
+                        if line.startswith("^") and entries:
+                            entries[-1] = (entries[-1][0], entries[-1][1], line[1:])
+                            continue
+                        values = line.split(" ", 1)
+                        if len(values) == 2:
+                            entries.append((values[0], values[1], None))
+            except OSError:
+                pass
+            return entries
+
+        # Resolves an annotated (loose) tag object to the commit it points at
+        def peel_tag_object(obj_hash):
+            obj_path = os.path.join(git_dir, "objects", obj_hash[:2], obj_hash[2:])
+            try:
+                with open(obj_path, "rb") as f:
+                    data = zlib.decompress(f.read())
+            except (OSError, zlib.error):
+                return None
+            if not data.startswith(b"tag "):
+                return obj_hash
+            idx = data.find(b"object ")
+            if idx < 0:
+                return None
+            return data[idx + 7 : idx + 47].decode("ascii")
+
+        head = read_ref_file(os.path.join(git_dir, "HEAD"))
+        if head is None:
+            return get_tag_or_hash_via_git(path)
+
+        packed_refs = read_packed_refs()
+
+        if head.startswith("ref: "):
+            ref = head[5:]
+            commit = read_ref_file(os.path.join(git_dir, *ref.split("/")))
+            if commit is None:
+                commit = next((h for h, name, _ in packed_refs if name == ref), None)
+            if commit is None:
+                return get_tag_or_hash_via_git(path)
+        else:
+            commit = head
+
+        try:
+            with os.scandir(os.path.join(git_dir, "refs", "tags")) as it:
+                for entry in it:
+                    if not entry.is_file(follow_symlinks=False):
+                        continue
+                    tag_hash = read_ref_file(entry.path)
+                    if tag_hash == commit:
+                        return entry.name
+                    if tag_hash is not None:
+                        peeled = peel_tag_object(tag_hash)
+                        if peeled is None:
+                            return get_tag_or_hash_via_git(path)
+                        if peeled == commit:
+                            return entry.name
+        except OSError:
+            pass
+
+        for tag_hash, name, peeled in packed_refs:
+            if name.startswith("refs/tags/") and commit in (tag_hash, peeled):
+                return name[len("refs/tags/") :]
+
+        return commit
+
+    # Keyed on the content of HEAD and of the ref it points at — mtimes alone
+    # would miss a same-branch pull, which rewrites the ref file but not HEAD
+    # — plus the workflow file's mtime
+    def get_cache_key():
+        git_dir = PROJECT_ROOT / ".git"
+        try:
+            head = (git_dir / "HEAD").read_bytes()
+            digest = hashlib.sha256(head)
+            if head.startswith(b"ref: "):
+                ref = head[5:].strip().decode("ascii")
+                try:
+                    digest.update((git_dir / ref).read_bytes())
+                except OSError:
+                    # The ref may only exist packed; fold packed-refs in
+                    try:
+                        digest.update((git_dir / "packed-refs").read_bytes())
+                    except OSError:
+                        pass
+            return f"{digest.hexdigest()} {GITLAB_WORKFLOW_PATH.stat().st_mtime_ns}"
+        except (OSError, UnicodeDecodeError):
             return None
-        return result.stdout.decode("ascii").strip()
 
+    # Scans the raw bytes of the workflow file for the one interesting line
+    # instead of decoding and allocating a str per line: a single regex search
+    # over the mapped file grabs the match and the rest of its line at once.
     def get_expected_tag():
-        with open("../.github/workflows/gitlab.yml", "r", encoding="utf-8") as f:
-            lines = [line.strip() for line in f if "triggered-ref" in line]
-            if len(lines) == 0:
+        with open(GITLAB_WORKFLOW_PATH, "rb") as f:
+            try:
+                mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:  # empty file
                 return None
-            line = lines[0]
-            values = line.split(" ")
+            with mm:
+                match = TRIGGERED_REF_RE.search(mm)
+                if match is None:
+                    return None
+                line = match.group().decode("utf-8")
+            values = line.strip().split(" ")
             if len(values) != 2:
                 return None
             return values[1]
 
+    # Spawning git and parsing the workflow file is pure overhead when neither
+    # the checked out commit nor the workflow file changed since the last
+    # successful verification, so cache the key — plain text, nothing to
+    # deserialize.
+    cache_key = get_cache_key()
+    if cache_key is not None:
+        try:
+            if VERIFY_CACHE_PATH.read_text(encoding="ascii").strip() == cache_key:
+                return
+        except (OSError, UnicodeDecodeError):
+            pass
+
+    def save_cache_key():
+        if cache_key is None:
+            return
+        try:
+            VERIFY_CACHE_PATH.parent.mkdir(parents=True, exist_ok=True)
+            VERIFY_CACHE_PATH.write_text(cache_key, encoding="ascii")
+        except OSError:
+            pass
+
     actual = get_tag_or_hash_of_dir(PROJECT_ROOT)
     if actual is None:
         return
     expected_tag = get_expected_tag()
     if expected_tag is None:
         return
-    if expected_tag != actual:
-        print(
-            "################################################################################"
-        )
-        print(
+    if expected_tag == actual:
+        save_cache_key()
+    else:
+        # One preassembled stderr write instead of the old banner + 5 second
+        # sleep; this can run concurrently with the builds, hence the lock
+        warning = "\n".join([
+            "#" * 80,
             f"Project root ({PROJECT_ROOT}) and 'triggered-ref' in"
-            " ../.github/workflows/gitlab.yml differ"
-        )
-        print(f"        '{actual}' vs '{expected_tag}'")
-        print("!!! Nat-lab might not behave correctly !!!")
-        print(
-            "################################################################################"
-        )
-        time.sleep(5)
+            f" {GITLAB_WORKFLOW_PATH} differ",
+            f"        '{actual}' vs '{expected_tag}'",
+            "!!! Nat-lab might not behave correctly !!!",
+            "#" * 80,
+        ])
+        with PRINT_LOCK:
+            print(warning, file=sys.stderr)
 
 
 if __name__ == "__main__":
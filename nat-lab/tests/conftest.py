@@ -646,12 +646,89 @@ async def collect_kernel_logs(items, suffix):
                     raise e
 
 
-def pytest_collection_modifyitems(items):
+def pytest_collection_modifyitems(config, items):
     for item in items:
-        # Apply 5 minutes timeout to windows tests (due to constant lag)
-        if item.get_closest_marker("windows"):
+        # Long tests get 10 minutes and windows tests 5 (due to constant
+        # lag); everything else keeps the short CLI default
+        if item.get_closest_marker("long"):
+            item.add_marker(pytest.mark.timeout(600))
+        elif item.get_closest_marker("windows"):
             item.add_marker(pytest.mark.timeout(300))
 
+    filter_shard(config, items)
+    schedule_slowest_files_first(items)
+
+
+# Total recorded runtime per test file, from the compiled durations file that
+# run_local.py points NATLAB_TEST_DURATIONS_FILE at. Empty when no durations
+# have been recorded yet; missing files look up as 0.
+def load_recorded_file_totals():
+    durations_file = os.environ.get("NATLAB_TEST_DURATIONS_FILE")
+    if not durations_file:
+        return defaultdict(float)
+    try:
+        with open(durations_file, "r", encoding="utf-8") as f:
+            durations = json.load(f)
+    except (OSError, ValueError):
+        return defaultdict(float)
+    file_totals: defaultdict = defaultdict(float)
+    for nodeid, duration in durations.items():
+        file_totals[nodeid.split("::", 1)[0]] += duration
+    return file_totals
+
+
+# CI sharding: partitions the collected files into NATLAB_SHARD_TOTAL
+# equal-runtime groups and keeps only this node's group. Whole files stay
+# together for the same reason --dist=loadfile is used — the heavyweight
+# fixtures are per-file. Greedy longest-processing-time assignment over the
+# recorded file runtimes; files without data get the average weight so new
+# tests still spread out. Every node computes the same partition because the
+# inputs (the sorted file list and the shared durations file) are identical
+# on every node.
+def filter_shard(config, items):
+    total = int(os.environ.get("NATLAB_SHARD_TOTAL", "1"))
+    if total <= 1:
+        return
+    index = int(os.environ.get("NATLAB_SHARD_INDEX", "1"))
+
+    file_totals = load_recorded_file_totals()
+    files = sorted({item.nodeid.split("::", 1)[0] for item in items})
+    known = [file_totals[f] for f in files if f in file_totals]
+    default_weight = sum(known) / len(known) if known else 1.0
+
+    def weight(f):
+        return file_totals[f] if f in file_totals else default_weight
+
+    groups: List[list] = [[0.0, set()] for _ in range(total)]
+    for f in sorted(files, key=lambda f: (-weight(f), f)):
+        group = min(groups, key=lambda g: g[0])
+        group[0] += weight(f)
+        group[1].add(f)
+
+    keep = groups[index - 1][1]
+    selected = [i for i in items if i.nodeid.split("::", 1)[0] in keep]
+    deselected = [i for i in items if i.nodeid.split("::", 1)[0] not in keep]
+    if deselected:
+        config.hook.pytest_deselected(items=deselected)
+        items[:] = selected
+
+
+# Profile-guided scheduling: when recorded durations are available, reorder
+# the collected tests so the files with the largest total runtime come first.
+# Under pytest-xdist's loadfile distribution that is longest-processing-time
+# scheduling — handing out the big files early keeps one slow file from
+# becoming the straggler at the end of the run. The sort is stable, so the
+# order within a file is untouched.
+def schedule_slowest_files_first(items):
+    if not os.environ.get("NATLAB_TEST_DURATIONS_FILE"):
+        return
+    file_totals = load_recorded_file_totals()
+    if not file_totals:
+        return
+    items.sort(
+        key=lambda item: file_totals[item.nodeid.split("::", 1)[0]], reverse=True
+    )
+
 
 def pytest_runtestloop(session):
     if not session.config.option.collectonly:
@@ -668,6 +745,32 @@ def pytest_runtest_setup():
     asyncio.run(perform_pretest_cleanups())
 
 
+NODE_DURATIONS: defaultdict = defaultdict(float)
+
+
+# Records per-test wall time for the CI shard balancing. The setup, call and
+# teardown stages of a test arrive as separate reports and are summed per
+# nodeid; run_local.py points NATLAB_NODE_DURATIONS_FILE at this node's file.
+def pytest_runtest_logreport(report):
+    if os.environ.get("NATLAB_NODE_DURATIONS_FILE"):
+        NODE_DURATIONS[report.nodeid] += report.duration
+
+
+def save_node_durations(session):
+    out = os.environ.get("NATLAB_NODE_DURATIONS_FILE")
+    if not out or not NODE_DURATIONS:
+        return
+    # Under xdist the workers forward their reports to the controller, which
+    # is the only process that should write the file
+    if hasattr(session.config, "workerinput"):
+        return
+    # tmp file + os.replace so an interrupted run never leaves a partial file
+    tmp_path = out + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(NODE_DURATIONS, f, separators=(",", ":"))
+    os.replace(tmp_path, out)
+
+
 # Session-long AsyncExitStack is created at session start and closed at session finish.
 # pylint: disable=unused-argument
 def pytest_sessionstart(session):
@@ -684,6 +787,8 @@ def pytest_sessionstart(session):
 
 # pylint: disable=unused-argument
 def pytest_sessionfinish(session, exitstatus):
+    save_node_durations(session)
+
     if os.environ.get("NATLAB_SAVE_LOGS") is None:
         return
 